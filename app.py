@@ -1,17 +1,82 @@
-from flask import Flask, request, jsonify
-from requests.auth import HTTPBasicAuth
+from flask import Flask, request, jsonify, redirect
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from google.cloud import storage
+import base64
+import functools
+import threading
+import orjson
 import requests
 import re
 import os
-import time
-import io
+import pathlib
+import random
+import shutil
 import time
 from datetime import datetime
 
 app = Flask(__name__)
 
+## HTTP SESSION
+
+#Upper bound on parallel page exports per space request
+MAX_CONCURRENCY = 32
+
+#Upper bound on the number of pages accepted by the batch endpoint
+MAX_BATCH_PAGES = 500
+
+#Shared session so all calls against the same Confluence host reuse pooled
+#keep-alive connections instead of paying a TCP+TLS handshake per request.
+#pool_maxsize covers every worker at full concurrency, otherwise urllib3
+#discards connections ("Connection pool is full") and keep-alive is lost
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=max(64, MAX_CONCURRENCY * 2),
+    max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504))
+))
+
+@functools.lru_cache(maxsize=8)
+def _basic_auth_header(email, api_token):
+    """
+    Builds the Basic auth header value for a credential pair, cached so the
+    base64 encoding happens once per (email, api_token) instead of per request.
+    """
+    return "Basic " + base64.b64encode(f"{email}:{api_token}".encode()).decode()
+
+#Single lazily created Google Cloud Storage client, so credentials are
+#resolved once per process instead of once per uploaded page
+_GCS_CLIENT = None
+_GCS_CLIENT_LOCK = threading.Lock()
+
+@functools.lru_cache(maxsize=4)
+def _gcs_bucket(gcs_bucket_name):
+    """
+    Returns a cached Bucket handle, creating the shared client on first use.
+    """
+    global _GCS_CLIENT
+    with _GCS_CLIENT_LOCK:
+        if _GCS_CLIENT is None:
+            _GCS_CLIENT = storage.Client()
+    return _GCS_CLIENT.bucket(gcs_bucket_name)
+
+#Precompiled patterns used on every page export
+_META_TAG_RE = re.compile(r'<meta\s+name="ajs-(taskId|cloud-id)"\s+content="([^"]+)"')
+
+#Translation table for filenames: spaces become underscores, non-word
+#characters are dropped by the filter in convert_title_to_filename
+_TITLE_TRANS = str.maketrans({" ": "_"})
+
 ## CONFLUENCE API
 
+#Per-process memo of idempotent ID lookups. Only successful results are
+#stored, so transient failures get retried instead of pinned
+_SPACE_ID_CACHE = {}
+_PAGE_TITLE_CACHE = {}
+_PAGE_EMPTY_CACHE = {}
+
 def get_confluence_space_id_by_key(domain: str, email: str, api_token: str, space_key: str) -> dict:
     """
     Fetches space ID details from the Confluence API.
@@ -26,23 +91,23 @@ def get_confluence_space_id_by_key(domain: str, email: str, api_token: str, spac
         str: The ID of the space provided, otherwise None
     """
 
-    import base64
-    auth_string = f"{email}:{api_token}"
-    encoded_auth_string = base64.b64encode(auth_string.encode()).decode()
-    
+    if (domain, space_key) in _SPACE_ID_CACHE:
+        return _SPACE_ID_CACHE[(domain, space_key)]
+
     url = f"https://{domain}/wiki/rest/api/space/{space_key}"
     headers = {
-        "Authorization": f"Basic {encoded_auth_string}",
+        "Authorization": _basic_auth_header(email, api_token),
         "Accept": "application/json"
     }
-    response = requests.get(url, headers=headers)
-    data = handle_json_errors(response)
-    if 'error' in data:
+    try:
+        data = get_json_with_cache(url, headers=headers)
+    except ConfluenceAPIError:
         return None
     space_id = data.get("id")
     if space_id is None:
         print(f"Error: 'id' field missing in response when fetching space {space_key}")
         return None
+    _SPACE_ID_CACHE[(domain, space_key)] = space_id
     return space_id
 
 def get_confluence_homepage_id_by_space_id(domain: str, email: str, api_token: str, space_id: str):
@@ -59,13 +124,13 @@ def get_confluence_homepage_id_by_space_id(domain: str, email: str, api_token: s
         s: ID of the homepage, None otherwise
     """
     url = f"https://{domain}/wiki/api/v2/spaces/{space_id}/pages"
-    auth = HTTPBasicAuth(email, api_token)
     headers = {
+      "Authorization": _basic_auth_header(email, api_token),
       "Accept": "application/json"
     }
-    response = requests.get(url, headers=headers, auth=auth)
-    data = handle_json_errors(response)
-    if 'error' in data:
+    try:
+        data = get_json_with_cache(url, headers=headers)
+    except ConfluenceAPIError:
         return None
     pages = data.get("results")
     if pages is None:
@@ -77,52 +142,82 @@ def get_confluence_homepage_id_by_space_id(domain: str, email: str, api_token: s
             return page['id']
     return None
 
-def get_confluence_children_by_parent_page_id_recursive(domain: str, email: str, api_token: str, page_id: str):
+def paginate_confluence_results(domain: str, url: str, headers=None, params=None):
     """
-    Fetches all child pages of a given Confluence page recursively, handling pagination.
-    
+    Iterates a paginated Confluence v2 listing, yielding each page of 'results'
+    and following the 'next' relation in the Link header until exhausted.
+
     Args:
         domain (str): The Confluence instance domain (e.g., 'your-domain.atlassian.net').
-        email (str): The email address of the Confluence user.
-        api_token (str): The API token for authentication.
-        page_id (str): The ID of the page to fetch children from.
+        url (str): The listing URL to start from.
+        headers (dict): Request headers, including Authorization.
+        params (dict): Query parameters for the request. Optional.
 
-    Returns:
-        dict: A dictionary of all child page IDs and titles.
+    Yields:
+        list: One page of results at a time. Stops early if a request fails.
     """
-    base_url = f"https://{domain}/wiki/api/v2/pages/{page_id}/children"
-    auth = HTTPBasicAuth(email, api_token)
-    headers = {"Accept": "application/json"}
-    params = {"limit": "250"}
-
-    pages_ids_dict = {}
-
-    url = base_url  # Start with the initial URL
     while url:
-        response = requests.get(url, headers=headers, auth=auth, params=params)
-        data = handle_json_errors(response)
-        if 'error' in data:
-            return {}
+        response = _SESSION.get(url, headers=headers, params=params)
+        try:
+            data = handle_json_errors(response)
+        except ConfluenceAPIError:
+            return
         if 'results' not in data:
-            print(f"Error: 'results' field missing when fetching children")
-            return {}
+            print(f"Error: 'results' field missing when fetching results")
+            return
 
-        # Store page IDs and titles
-        for child in data["results"]:
-            pages_ids_dict[child["id"]] = child["title"]
+        yield data["results"]
 
-        # Check for pagination in the Link header
+        # Follow the "next" relation in the Link header, if any
+        url = None
         link_header = response.headers.get("Link")
         if link_header:
-            links = {rel.split(";")[1].strip(): rel.split(";")[0].strip("<>") for rel in link_header.split(",")}
-            next_url = links.get('rel="next"')
-            url = f"https://{domain}{next_url}" if next_url else None  # Only update if there's another page
-        else:
-            url = None  # No more pages
+            for link in requests.utils.parse_header_links(link_header):
+                if link.get("rel") == "next":
+                    url = f"https://{domain}{link['url']}"
+                    break
+
+def get_confluence_children_by_parent_page_id_recursive(domain: str, email: str, api_token: str, page_id: str, concurrency=MAX_CONCURRENCY):
+    """
+    Fetches all descendant pages of a given Confluence page, handling pagination.
+
+    Traverses the tree level by level and fetches each level's children
+    concurrently, so wall-clock cost scales with tree depth instead of one
+    serialized round-trip per page.
 
-    # Recursively fetch children of each retrieved page
-    for child_id in list(pages_ids_dict.keys()):
-        pages_ids_dict.update(get_confluence_children_by_parent_page_id_recursive(domain, email, api_token, child_id))
+    Args:
+        domain (str): The Confluence instance domain (e.g., 'your-domain.atlassian.net').
+        email (str): The email address of the Confluence user.
+        api_token (str): The API token for authentication.
+        page_id (str): The ID of the page to fetch children from.
+        concurrency (int): Number of child listings to fetch in parallel. Optional.
+
+    Returns:
+        dict: A dictionary of all descendant page IDs and titles.
+    """
+    headers = {"Authorization": _basic_auth_header(email, api_token), "Accept": "application/json"}
+    params = {"limit": "250"}
+
+    def fetch_children(parent_id):
+        url = f"https://{domain}/wiki/api/v2/pages/{parent_id}/children"
+        children = {}
+        for results in paginate_confluence_results(domain, url, headers=headers, params=params):
+            for child in results:
+                children[child["id"]] = child["title"]
+        return children
+
+    pages_ids_dict = {}
+    frontier = [page_id]
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while frontier:
+            next_frontier = []
+            # One wave of requests per tree level
+            for children in executor.map(fetch_children, frontier):
+                for child_id, child_title in children.items():
+                    if child_id not in pages_ids_dict:
+                        pages_ids_dict[child_id] = child_title
+                        next_frontier.append(child_id)
+            frontier = next_frontier
 
     return pages_ids_dict
 
@@ -142,80 +237,133 @@ def get_confluence_pages_by_space_id_limit(domain: str, email: str, api_token: s
     """
     limit = abs(limit) if limit <= 250 else 250
     url = f"https://{domain}/wiki/api/v2/spaces/{space_id}/pages"
-    auth = HTTPBasicAuth(email, api_token)
-    headers = {"Accept": "application/json"}
+    headers = {"Authorization": _basic_auth_header(email, api_token), "Accept": "application/json"}
     params = {"limit": limit}  # Fetch the max number per request
-    response = requests.get(url, headers=headers, auth=auth, params=params)
-    data = handle_json_errors(response)
-    if 'error' in data:
+    response = _SESSION.get(url, headers=headers, params=params)
+    try:
+        data = handle_json_errors(response)
+    except ConfluenceAPIError:
         return []
     if 'results' not in data:
         print(f"Error: 'results' field missing when fetching children")
         return []
     return data["results"]
 
-def get_confluence_pages_by_space_id(domain: str, email: str, api_token: str, space_id: str):
+def get_confluence_pages_by_space_id(domain: str, email: str, api_token: str, space_id: str, body_format=None):
     """
     Fetches all Confluence pages from a Space ID, handling pagination.
     Refer to: https://developer.atlassian.com/cloud/confluence/rest/v2/api-group-page/#api-spaces-id-pages-get
-    
+
     Args:
         domain (str): The Confluence instance domain (e.g., 'your-domain.atlassian.net').
         email (str): The email address of the Confluence user.
         api_token (str): The API token for authentication.
         space_id (str): The ID of the space to fetch details for.
+        body_format (str): Body format to include per page (e.g. 'export_view'). Optional.
 
     Returns:
         list: A list of all pages retrieved from Confluence.
     """
     url = f"https://{domain}/wiki/api/v2/spaces/{space_id}/pages"
-    auth = HTTPBasicAuth(email, api_token)
-    headers = {"Accept": "application/json"}
+    headers = {"Authorization": _basic_auth_header(email, api_token), "Accept": "application/json"}
     params = {"limit": "250"}  # Fetch the max number per request
+    if body_format:
+        params["body-format"] = body_format
     all_pages = []
 
-    while url:
-        response = requests.get(url, headers=headers, auth=auth, params=params)
-        data = handle_json_errors(response)
-        if 'error' in data:
-            return []
-        if 'results' not in data:
-            print(f"Error: 'results' field missing when fetching children")
-            return []
-
-        all_pages.extend(data["results"])  # Collect page data
-
-        # Handle pagination via "Link" header
-        link_header = response.headers.get("Link")
-        if link_header:
-            links = {rel.split(";")[1].strip(): rel.split(";")[0].strip("<>") for rel in link_header.split(",")}
-            next_url = links.get('rel="next"')
-            url = f"https://{domain}{next_url}" if next_url else None
-        else:
-            url = None  # No more pages
+    for results in paginate_confluence_results(domain, url, headers=headers, params=params):
+        all_pages.extend(results)  # Collect page data
 
     return all_pages
   
-def get_pdf_export_confluence_url(domain, email, api_token, page_id):
+#Presigned download URLs stay valid for a few minutes; cache them per page so
+#retries and repeated requests skip the two-call export handshake. Entries are
+#dropped on expiry or once a download succeeds
+_PDF_URL_CACHE = {}
+_PDF_URL_CACHE_LOCK = threading.Lock()
+_PDF_URL_TTL = 300
+
+def _get_cached_pdf_export_url(domain, page_id):
+    """Returns a still-valid cached presigned URL for a page, or None."""
+    with _PDF_URL_CACHE_LOCK:
+        cached = _PDF_URL_CACHE.get((domain, page_id))
+        if cached and cached[1] > time.monotonic():
+            return cached[0]
+        _PDF_URL_CACHE.pop((domain, page_id), None)
+    return None
+
+def _store_pdf_export_url(domain, page_id, url):
+    """Caches a freshly issued presigned URL for its expected validity window."""
+    with _PDF_URL_CACHE_LOCK:
+        _PDF_URL_CACHE[(domain, page_id)] = (url, time.monotonic() + _PDF_URL_TTL)
+
+def _invalidate_pdf_export_url(domain, page_id):
+    """Drops a cached presigned URL, e.g. once its download has succeeded."""
+    with _PDF_URL_CACHE_LOCK:
+        _PDF_URL_CACHE.pop((domain, page_id), None)
+
+def start_pdf_export_confluence_task(domain, email, api_token, page_id):
     """
+    Kicks off the PDF render of a page and returns its task identifiers.
     Refer to: https://confluence.atlassian.com/confkb/rest-api-to-export-and-download-a-page-in-pdf-format-1388160685.html
+
+    Args:
+        domain (str): The Confluence instance domain (e.g., 'your-domain.atlassian.net').
+        email (str): The email address of the Confluence user.
+        api_token (str): The API token for authentication.
+        page_id (str): The ID of the page to export.
+
+    Returns:
+        dict: taskId and cloudId of the export task, None on failure.
     """
     # Construct the export URL
     url = f"https://{domain}/wiki/spaces/flyingpdf/pdfpageexport.action?pageId={page_id}&unmatched-route=true"
-    auth = HTTPBasicAuth(email, api_token)
     headers = {
+        "Authorization": _basic_auth_header(email, api_token),
         "X-Atlassian-Token": "no-check",
     }
-    response = requests.get(url, headers=headers, auth=auth, allow_redirects=True)
+    response = _SESSION.get(url, headers=headers, allow_redirects=True)
     if response.status_code != 200:
-        return {"error": f"Request failed with status {response.status_code}", "details": response.text}
+        print(f"PDF export request for page {page_id} failed with status {response.status_code}")
+        return None
 
-    task_cloud_ids = extract_task_and_cloud_id_from_html(response.text)
+    return extract_task_and_cloud_id_from_html(response.text)
+
+def get_presigned_url_for_pdf_export_task(domain, email, api_token, task_cloud_ids):
+    """
+    Resolves the presigned download URL for a previously started export task.
+
+    Args:
+        domain (str): The Confluence instance domain (e.g., 'your-domain.atlassian.net').
+        email (str): The email address of the Confluence user.
+        api_token (str): The API token for authentication.
+        task_cloud_ids (dict): taskId and cloudId as returned by start_pdf_export_confluence_task.
+
+    Returns:
+        str: The presigned download URL, None on failure.
+    """
+    download_url = f"https://{domain}/wiki/services/api/v1/download/pdf?taskId={task_cloud_ids['taskId']}&cloudId={task_cloud_ids['cloudId']}"
+    download_response = _SESSION.get(download_url, headers={"Authorization": _basic_auth_header(email, api_token)})
+    if download_response.status_code != 200:
+        print(f"Presigned URL lookup failed with status {download_response.status_code}")
+        return None
+    return download_response.text
+
+def get_pdf_export_confluence_url(domain, email, api_token, page_id):
+    """
+    Starts a PDF export and resolves its presigned download URL in one go.
+    A still-valid URL from a recent request is reused without new API calls.
+    Refer to: https://confluence.atlassian.com/confkb/rest-api-to-export-and-download-a-page-in-pdf-format-1388160685.html
+    """
+    url = _get_cached_pdf_export_url(domain, page_id)
+    if url:
+        return url
+    task_cloud_ids = start_pdf_export_confluence_task(domain, email, api_token, page_id)
     if task_cloud_ids:
-      download_url = f"https://{domain}/wiki/services/api/v1/download/pdf?taskId={task_cloud_ids['taskId']}&cloudId={task_cloud_ids['cloudId']}"
-      download_response = requests.get(download_url, auth=HTTPBasicAuth(email, api_token))
-      presigned_url = download_response.text
-      return presigned_url
+        url = get_presigned_url_for_pdf_export_task(domain, email, api_token, task_cloud_ids)
+        if url:
+            _store_pdf_export_url(domain, page_id, url)
+        return url
   
 def get_confluence_page_title_by_id(domain: str, email: str, api_token: str, page_id: str):
     """
@@ -230,21 +378,25 @@ def get_confluence_page_title_by_id(domain: str, email: str, api_token: str, pag
     Returns:
         title: page title, None otherwise
     """
+    if (domain, page_id) in _PAGE_TITLE_CACHE:
+        return _PAGE_TITLE_CACHE[(domain, page_id)]
+
     url = f"https://{domain}/wiki/api/v2/pages/{page_id}"
-    auth = HTTPBasicAuth(email, api_token)
     headers = {
+      "Authorization": _basic_auth_header(email, api_token),
       "Accept": "application/json"
     }
-    response = requests.request("GET", url, headers=headers, auth=auth)
-    data = handle_json_errors(response)
-    if 'error' in data:
+    try:
+        data = get_json_with_cache(url, headers=headers)
+    except ConfluenceAPIError:
         return None
     if 'title' not in data:
-        print(f"Error: 'results' field missing when fetching children")
+        print(f"Error: 'title' field missing when fetching page title")
         return None
+    _PAGE_TITLE_CACHE[(domain, page_id)] = data['title']
     return data['title']
   
-def get_confluence_page_content_by_id(domain: str, email: str, api_token: str, page_id: str):
+def get_confluence_page_content_by_id(domain: str, email: str, api_token: str, page_id: str, body_format: str = "export_view"):
     """
     Fetches page's content from the Confluence API.
     Refer to: https://developer.atlassian.com/cloud/confluence/rest/v2/api-group-page/#api-pages-id-get
@@ -253,21 +405,23 @@ def get_confluence_page_content_by_id(domain: str, email: str, api_token: str, p
         email (str): The email address of the Confluence user.
         api_token (str): The API token for authentication.
         page_id (str): The ID of the page to fetch content from.
+        body_format (str): Body representation to fetch. 'storage' is typically an
+                           order of magnitude smaller than the rendered 'export_view'.
 
     Returns:
         A string with content of the page
     """
-    url = f"https://{domain}/wiki/rest/api/content/{page_id}?expand=body.export_view"
-    auth = HTTPBasicAuth(email, api_token)
+    url = f"https://{domain}/wiki/rest/api/content/{page_id}?expand=body.{body_format}"
     headers = {
+      "Authorization": _basic_auth_header(email, api_token),
       "Accept": "application/json"
     }
-    response = requests.request("GET", url, headers=headers, auth=auth)
-    data = handle_json_errors(response)
-    if 'error' in data:
+    try:
+        data = get_json_with_cache(url, headers=headers)
+    except ConfluenceAPIError:
         return None
     try:
-        page_content = data['body']['export_view']['value']
+        page_content = data['body'][body_format]['value']
     except KeyError as e:
         print(f"Error accessing page content for page {page_id}: {e}")
         return None
@@ -285,22 +439,110 @@ def is_empty_confluence_page(domain: str, email: str, api_token: str, page_id: s
     Returns:
         A  boolean value
     """
-    page_content = get_confluence_page_content_by_id(domain, email, api_token, page_id)
-    return page_content.strip() in ["<p />", ""]
+    if (domain, page_id) in _PAGE_EMPTY_CACHE:
+        return _PAGE_EMPTY_CACHE[(domain, page_id)]
+
+    #The compact 'storage' representation is enough to detect emptiness and
+    #avoids transferring the full rendered HTML of every page
+    page_content = get_confluence_page_content_by_id(domain, email, api_token, page_id, body_format="storage")
+    if page_content is None:
+        return False
+    is_empty = is_empty_page_body(page_content)
+    _PAGE_EMPTY_CACHE[(domain, page_id)] = is_empty
+    return is_empty
+
+def is_empty_page_body(page_content):
+    """
+    Checks whether a page body string represents an empty Confluence page.
+
+    Args:
+        page_content (str): The page body, or None if it could not be fetched.
+
+    Returns:
+        A boolean value. None counts as not empty so the export is still attempted.
+    """
+    return page_content is not None and page_content.strip() in ["<p />", ""]
 
 ## HELPER FUNCTIONS
 
+#Conditional GET cache: URL -> (etag, last_modified, parsed_body). A 304 Not
+#Modified reuses the cached body, so unchanged pages cost no transfer (and
+#304s do not count against Atlassian rate limits)
+_JSON_CACHE = {}
+_JSON_CACHE_LOCK = threading.Lock()
+
+def get_json_with_cache(url, headers=None):
+    """
+    Performs a GET returning parsed JSON, revalidating a local cache with
+    If-None-Match / If-Modified-Since conditional headers.
+
+    Args:
+        url (str): URL to fetch.
+        headers (dict): Request headers, including Authorization.
+
+    Returns:
+        dict: The parsed JSON body.
+
+    Raises:
+        ConfluenceAPIError: Propagated from handle_json_errors on failure.
+    """
+    headers = dict(headers) if headers else {}
+    with _JSON_CACHE_LOCK:
+        cached = _JSON_CACHE.get(url)
+    if cached:
+        etag, last_modified, _ = cached
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+    response = _SESSION.get(url, headers=headers)
+    if response.status_code == 304 and cached:
+        return cached[2]
+
+    data = handle_json_errors(response)
+    etag = response.headers.get("ETag")
+    last_modified = response.headers.get("Last-Modified")
+    if etag or last_modified:
+        with _JSON_CACHE_LOCK:
+            _JSON_CACHE[url] = (etag, last_modified, data)
+    return data
+
+class ConfluenceAPIError(Exception):
+    """
+    Raised when a Confluence API call fails or returns a non-JSON body.
+    Carries the HTTP status code and a truncated snippet of the response.
+    """
+
+    def __init__(self, status_code, details):
+        self.status_code = status_code
+        self.details = details
+        super().__init__(f"Request failed with status {status_code}: {details}")
+
 def handle_json_errors(response):
-    if response.status_code == 200:
-        try:
-            data = response.json()
-            return data
-        except ValueError:
-            print(f"API response is not JSON formatted: {response.text}")
-            return {"error": "Response is not JSON formatted", "details": response.text}
-    else:
-        print(f"API request failed: {response.status_code} - {response.text}")
-        return {"error": f"Request failed with status {response.status_code}", "details": response.text}
+    """
+    Parses an HTTP response as JSON, failing fast on errors.
+
+    Args:
+        response (requests.Response): The HTTP response object to parse.
+
+    Returns:
+        dict: The parsed JSON body.
+
+    Raises:
+        ConfluenceAPIError: If the status is not 200 or the body is not JSON.
+        The error body is truncated to 512 characters so failures never drag
+        a full HTML error page around.
+    """
+    if response.status_code != 200:
+        print(f"API request failed: {response.status_code} - {response.text[:512]}")
+        raise ConfluenceAPIError(response.status_code, response.text[:512])
+    try:
+        #orjson parses large listing payloads several times faster than stdlib json
+        return orjson.loads(response.content)
+    except orjson.JSONDecodeError:
+        print(f"API response is not JSON formatted: {response.text[:512]}")
+        raise ConfluenceAPIError(response.status_code, response.text[:512])
 
 def extract_task_and_cloud_id_from_html(html_string):
     """
@@ -312,19 +554,71 @@ def extract_task_and_cloud_id_from_html(html_string):
     Returns:
         A dictionary containing taskId and cloudId, or None if not found.
     """
-    # Regular expressions to match the meta tags
-    task_id_match = re.search(r'<meta\s+name="ajs-taskId"\s+content="([^"]+)"', html_string)
-    cloud_id_match = re.search(r'<meta\s+name="ajs-cloud-id"\s+content="([^"]+)"', html_string)
-
-    task_id = task_id_match.group(1) if task_id_match else None
-    cloud_id = cloud_id_match.group(1) if cloud_id_match else None
+    # Single pass over the document matching both meta tags, stopping as soon
+    # as both are found instead of scanning the full HTML twice
+    found = {}
+    for match in _META_TAG_RE.finditer(html_string):
+        name, content = match.groups()
+        found['taskId' if name == 'taskId' else 'cloudId'] = content
+        if len(found) == 2:
+            break
 
-    if task_id and cloud_id:
-        return {'taskId': task_id, 'cloudId': cloud_id}
+    if 'taskId' in found and 'cloudId' in found:
+        return found
     else:
         print("taskId or cloudId not found in the HTML")
         return None
       
+@functools.lru_cache(maxsize=32)
+def _ensure_directory(directory):
+    """
+    Creates a directory (parents included) once per process. Cached so repeated
+    downloads into the same folder skip the filesystem check entirely.
+    """
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    return directory
+
+def retry_after_seconds(response):
+    """
+    Parses the Retry-After header (seconds form) if the server sent one.
+
+    Args:
+        response (requests.Response): The HTTP response to inspect.
+
+    Returns:
+        int: Seconds the server asked us to wait, None if absent or unparseable.
+    """
+    try:
+        return max(0, int(response.headers.get("Retry-After")))
+    except (TypeError, ValueError):
+        return None
+
+def wait_for_presigned_url_ready(url, delays=(1, 2, 4, 8, 15, 30)):
+    """
+    Polls a presigned download URL with exponential backoff until it is ready.
+
+    Args:
+        url (str): Presigned download URL to poll.
+        delays (tuple): Backoff schedule in seconds between polls.
+
+    Returns:
+        bool: True once the URL answers 200, False if it never does.
+    """
+    for delay in delays:
+        time.sleep(delay)
+        response = _SESSION.head(url, allow_redirects=True)
+        if response.status_code == 200:
+            return True
+        #Prefer the server's own pacing hint over our schedule when throttled
+        server_wait = retry_after_seconds(response)
+        if server_wait:
+            print(f"Server asked to retry after {server_wait}s (status {response.status_code}), honoring...")
+            time.sleep(server_wait)
+        else:
+            print(f"Presigned URL not ready after {delay}s (status {response.status_code}), retrying...")
+    return False
+
 def download_pdf_from_presigned_url(url, output_path):
     """
     Authenticates with a server to retrieve a pre-signed URL and downloads a file.
@@ -336,24 +630,23 @@ def download_pdf_from_presigned_url(url, output_path):
     Return:
         Status code. 200 is succesful
     """
-    #Get path and filename
-    directory = os.path.dirname(output_path)
-    if not os.path.exists(directory):
-        os.makedirs(directory)
+    #Normalize the target path once. Directory creation is cached, so a space
+    #export into one folder costs a single makedirs instead of a stat per page
+    out = pathlib.Path(output_path)
+    if out.suffix.lower() != '.pdf':
+        out = out.with_name(out.name + '.pdf')
+    _ensure_directory(str(out.parent))
+    filename = out.name
+    output_path = str(out)
 
-    #Make sure filename ends in .pdf
-    filename = os.path.basename(output_path)
-    if not filename.lower().endswith('.pdf'):
-        filename += '.pdf'
-    output_path = f"{directory}/{filename}"
-        
-    response = requests.get(url, stream=True)
+    response = _SESSION.get(url, stream=True)
     
     if response.status_code == 200:
+        # Copy in 1 MiB blocks inside C code rather than a Python chunk loop
+        response.raw.decode_content = True
         with open(output_path, 'wb') as file:
-            for chunk in response.iter_content(chunk_size=8192):
-                file.write(chunk)
-        print(f"File downloaded successfully and saved as {filename}")  
+            shutil.copyfileobj(response.raw, file, length=1024 * 1024)
+        print(f"File downloaded successfully and saved as {filename}")
     else:
         print(f"Failed to download {filename}. Status code: {response.status_code}")
     
@@ -378,25 +671,21 @@ def download_pdf_from_presigned_url_to_gcs_bucket(url, filename, gcs_bucket_name
         filename += '.pdf'
         
     # Perform the request to get the file content
-    response = requests.get(url, stream=True)
+    response = _SESSION.get(url, stream=True)
     
     if response.status_code == 200:
-        # Initialize the Google Cloud Storage client
-        storage_client = storage.Client()
-        bucket = storage_client.bucket(gcs_bucket_name)
+        # Reuse the shared Google Cloud Storage client and bucket handle
+        bucket = _gcs_bucket(gcs_bucket_name)
         blob = bucket.blob(filename)
-        
-        # Use an in-memory BytesIO buffer to hold the file content temporarily
-        with io.BytesIO() as file_buffer:
-            for chunk in response.iter_content(chunk_size=8192):
-                file_buffer.write(chunk)
-            
-            # Reset buffer position to the beginning
-            file_buffer.seek(0)
-            
-            # Upload directly from the buffer
-            blob.upload_from_file(file_buffer, content_type='application/pdf')
-        
+        # 8 MiB resumable-upload chunks so large exports stream in few requests
+        blob.chunk_size = 8 * 1024 * 1024
+
+        # Stream the response body straight into the bucket: nothing is held
+        # in memory and the upload starts while bytes are still arriving
+        response.raw.decode_content = True
+        size = int(response.headers.get("Content-Length", 0)) or None
+        blob.upload_from_file(response.raw, content_type='application/pdf', size=size)
+
         print(f"File downloaded successfully and saved to GCS bucket {gcs_bucket_name} as {filename}")
     
     else:
@@ -416,26 +705,28 @@ def convert_title_to_filename(title, max_length=100):
         str: The converted filename with spaces replaced by underscores and non-word characters removed.
     """
     # Replace spaces with underscores and remove non-word characters
-    result = re.sub(r'\W+', '', title.strip().replace(' ', '_'))
-    
+    translated = title.strip().translate(_TITLE_TRANS)
+    result = ''.join(ch for ch in translated if ch.isalnum() or ch == '_')
+
     # Truncate to max_length while ensuring the file extension is preserved if present
     return result[:max_length].rstrip('_')
 
-def add_value_to_dict(dictionary, key, value):
-    """Adds a value to a dictionary at a given key.
+## FINAL OUTPUT FUNCTIONS
+
+def _retry_backoff(attempt, total_attempts=3):
+    """
+    Sleeps between retry attempts with exponential backoff and random jitter.
 
     Args:
-        dictionary: The dictionary to modify.
-        key: The key to use.
-        value: The value to add.
+        attempt (int): Zero-based index of the attempt that just failed.
+        total_attempts (int): Total attempts the caller will make. No sleep
+                              happens after the final attempt.
     """
-
-    if key not in dictionary:
-        dictionary[key] = [value]
-    else:
-        dictionary[key].append(value)
-        
-## FINAL OUTPUT FUNCTIONS
+    if attempt + 1 >= total_attempts:
+        return
+    delay = min(5 * 2 ** attempt + random.random(), 60)
+    print(f"Retrying in {delay:.1f} seconds...")
+    time.sleep(delay)
 
 def export_pdf_confluence_page_by_id(
     domain, 
@@ -445,8 +736,9 @@ def export_pdf_confluence_page_by_id(
     page_title=None, 
     output_path=None, 
     gcs_bucket_name=None,
-    wait_time=15):
-    
+    wait_time=15,
+    is_empty=None):
+
     """
     Exports a page as a PDF from the Confluence API.
     Args:
@@ -455,75 +747,107 @@ def export_pdf_confluence_page_by_id(
         api_token (str): The API token for authentication.
         page_id (str): The ID of the page to fetch details for.
         page_title (str): The title of the page to fetch details for. Optional.
-        output_path (str): Path where file will be downloaded to. Optional. 
+        output_path (str): Path where file will be downloaded to. Optional.
                            Default is 'confluence_downloads/'
         gcs_bucket (str): Google Cloud Storage bucket to upload the file to. Optional.
+        wait_time (int): Legacy fixed pre-download wait. Kept for API compatibility;
+                         the presigned URL is now polled until ready instead.
+        is_empty (bool): Whether the page is already known to be empty, e.g. from
+                         the space listing. Optional. Skips the content fetch when provided.
 
     Returns:
         str: Status of the downloaded page: 'EMPTY_PAGE', 'DOWNLOAD_SUCCESFUL', 'DOWNLOAD_FAILED'
     """
     
-    #Get page title if not provided
+    #Check if it is an empty page. Skip the extra content fetch when the
+    #caller already knows from the space listing
+    if is_empty is None:
+        is_empty = is_empty_confluence_page(domain, email, api_token, page_id)
+    if is_empty:
+        print(f"Page {page_id} is an empty page.")
+        return 'EMPTY_PAGE'
+
+    #Get page title if not provided. Done after the empty check so skipped
+    #pages never pay for the lookup
     if not page_title:
         page_title = get_confluence_page_title_by_id(domain, email, api_token, page_id)
+
+    #File page title, formatted and ending in confluencePageId=page_id
+    file_page_title = f"{convert_title_to_filename(page_title or '')}_confluencePageId={page_id}"
     
-    #File page title, formatted and ending in confluencePageId=page_id   
-    file_page_title = f"{convert_title_to_filename(page_title)}_confluencePageId={page_id}"
-    
-    #Check if it is an empty page
-    if is_empty_confluence_page(domain, email, api_token, page_id):
-        print(f"{file_page_title} is an empty page.")
-        return 'EMPTY_PAGE'
-    
-    #Wait time cannot be 0
-    if not wait_time or wait_time == 0:
-        wait_time = 15
+    #Normalize the local output path once, not per attempt
+    if not gcs_bucket_name:
+        if not output_path:
+            output_path = 'confluence_downloads/'
+        #Make sure output_path ends in /
+        output_path = output_path + "/" if not output_path.endswith("/") else output_path
 
-    #Try 3 times
+    #Try 3 times, only repeating the stage that actually failed: a transient
+    #download error reuses the existing export task instead of re-rendering.
+    #Every failure path backs off through _retry_backoff before the next
+    #attempt, so parallel workers never retry in lockstep
+    task_cloud_ids = None
     for attempt in range(3):
-        #Generate the presigned download URL
-        url = get_pdf_export_confluence_url(domain, email, api_token, page_id)
-        
-        #To avoid file not found error, wait a bit before downloading from the URL
-        time.sleep(wait_time)
-        
+        #Reuse a still-valid presigned URL from an earlier request, skipping
+        #the export handshake entirely
+        url = _get_cached_pdf_export_url(domain, page_id)
+        if url is None:
+            #Kick off the PDF render, unless a previous attempt's task is still usable
+            if task_cloud_ids is None:
+                task_cloud_ids = start_pdf_export_confluence_task(domain, email, api_token, page_id)
+            if task_cloud_ids is None:
+                print(f"Attempt {attempt + 1}: could not start PDF export for page {page_id}.")
+                _retry_backoff(attempt)
+                continue
+
+            #Resolve the presigned download URL for the task
+            url = get_presigned_url_for_pdf_export_task(domain, email, api_token, task_cloud_ids)
+            if url:
+                _store_pdf_export_url(domain, page_id, url)
+
+        #Poll the URL with exponential backoff instead of a blind wait: fast
+        #pages become downloadable after a second or two, slow ones still get
+        #up to a minute before the task is regenerated
+        if not url or not wait_for_presigned_url_ready(url):
+            print(f"Attempt {attempt + 1}: presigned URL for page {page_id} never became ready. Regenerating task...")
+            _invalidate_pdf_export_url(domain, page_id)
+            task_cloud_ids = None
+            _retry_backoff(attempt)
+            continue
+
         #Download the file, and store the status code
-        
+
         #If there is a bucket specified, download to bucket
-        if gcs_bucket_name:    
+        if gcs_bucket_name:
             download_url = download_pdf_from_presigned_url_to_gcs_bucket(url=url, filename=file_page_title, gcs_bucket_name=gcs_bucket_name)
             status_code = download_url['statusCode']
-            
+
         #If not, download to output_path
-        else: 
-            #If no output_path, then set to a value
-            if not output_path:
-                output_path = 'confluence_downloads/'
-            #Make sure output_path ends in /
-            output_path = output_path + "/" if not output_path.endswith("/") else output_path
-        
-            download_url = download_pdf_from_presigned_url(url=url, output_path=f"{output_path}{file_page_title}")  
+        else:
+            download_url = download_pdf_from_presigned_url(url=url, output_path=f"{output_path}{file_page_title}")
             status_code = download_url['statusCode']
         
         if status_code == 200:
+            #The URL has served its purpose; a later export should get a fresh one
+            _invalidate_pdf_export_url(domain, page_id)
             return 'DOWNLOAD_SUCCESFUL'
         else:
-            wait_time += 10 #Increase wait between url and download
-            print(f"Attempt {attempt + 1} failed with status code {status_code}. Retrying in 10 seconds...")
-            time.sleep(10)
-            
+            print(f"Attempt {attempt + 1} failed with status code {status_code}.")
+            _retry_backoff(attempt)
+
     return 'DOWNLOAD_FAILED'
 
-def export_pdf_confluence_space_by_key(domain, email, api_token, space_key, output_path=None, gcs_bucket_name=None, wait_time=15):
+def export_pdf_confluence_space_by_key(domain, email, api_token, space_key, output_path=None, gcs_bucket_name=None, wait_time=15, concurrency=8):
     """
     Exports all pages in a space as a PDF from the Confluence API.
-    
+
     Args:
         domain (str): The Confluence instance domain (e.g., 'your-domain.atlassian.net').
         email (str): The email address of the Confluence user.
         api_token (str): The API token for authentication.
         space_key (str): The key of the space to fetch details for (e.g. 'OR' your-domain.atlassian.atlassian.net/wiki/spaces/OR/).
         output_path (str): Path where file will be downloaded to. Optional.
+        concurrency (int): Number of pages to export in parallel. Optional. Default is 8.
 
     Returns:
         dict: pages_status. Keys = Page IDs, and Values = Status of the downloaded page: 'EMPTY_PAGE', 'DOWNLOAD_SUCCESFUL', 'DOWNLOAD_FAILED'
@@ -546,36 +870,59 @@ def export_pdf_confluence_space_by_key(domain, email, api_token, space_key, outp
         return
     print(f"Homepage ID: {homepage_id}")
 
-    #Get all pages
-    #pages_ids_dict = get_confluence_children_by_parent_page_id_recursive(domain, email, api_token, homepage_id)  
-    all_pages = get_confluence_pages_by_space_id(domain, email, api_token, space_id)
-    #all_pages = get_confluence_pages_by_space_id_limit(domain, email, api_token, space_id, limit=250)
+    #Get all pages via the flat space listing: one request per 250 pages rather
+    #than one per page as the recursive child walk did. Bodies are included so
+    #emptiness is known upfront and the per-page export does not need an extra
+    #content round-trip. Hierarchy, if ever needed, is available from each
+    #page's parentId in the same listing
+    all_pages = get_confluence_pages_by_space_id(domain, email, api_token, space_id, body_format="export_view")
     pages_ids_dict = {}
     for page in all_pages:
-        pages_ids_dict[page['id']] = page['title']
-    print(f"Page IDs and titles. Length {len(pages_ids_dict)}, Dictionary: {pages_ids_dict}")
+        body = page.get("body", {}).get("export_view", {}).get("value")
+        pages_ids_dict[page['id']] = {"title": page['title'], "empty": is_empty_page_body(body)}
+    print(f"Page IDs and titles. Length {len(pages_ids_dict)}, Dictionary: { {pid: info['title'] for pid, info in pages_ids_dict.items()} }")
     
+    #Prepare the download directory once for the whole space
+    if not gcs_bucket_name:
+        _ensure_directory(output_path or 'confluence_downloads/')
+
     #Store status of pages
-    pages_status = {}
-    
-    #Download pages
+    pages_status = defaultdict(list)
+
+    #Download pages in parallel. Exports are I/O bound (HTTPS + waits), so a
+    #bounded pool of workers overlaps them instead of paying each wait serially.
+    #Capped at MAX_CONCURRENCY so workers never outgrow the connection pool
+    concurrency = max(1, min(concurrency, MAX_CONCURRENCY))
     count = 0
-    for page_id, page_title in pages_ids_dict.items():
-        count += 1
-        if count % 25 == 0: #Multiples of 25
-            print(f"Document #{count}: {datetime.now()}")
-        page_status = export_pdf_confluence_page_by_id(
-            domain=domain,
-            email=email,
-            api_token=api_token,
-            page_id=page_id,
-            page_title=page_title,
-            output_path=output_path,
-            gcs_bucket_name=gcs_bucket_name,
-            wait_time=wait_time
-        )
-        add_value_to_dict(dictionary=pages_status, key=page_status, value=page_id)
-        
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {
+            executor.submit(
+                export_pdf_confluence_page_by_id,
+                domain=domain,
+                email=email,
+                api_token=api_token,
+                page_id=page_id,
+                page_title=page_info["title"],
+                output_path=output_path,
+                gcs_bucket_name=gcs_bucket_name,
+                wait_time=wait_time,
+                is_empty=page_info["empty"]
+            ): page_id
+            for page_id, page_info in pages_ids_dict.items()
+        }
+        for future in as_completed(futures):
+            count += 1
+            if count % 25 == 0: #Multiples of 25
+                print(f"Document #{count}: {datetime.now()}")
+            #A crashed worker should fail its own page, not the whole export
+            try:
+                page_status = future.result()
+            except Exception as e:
+                print(f"Export of page {futures[future]} raised: {e}")
+                page_status = 'DOWNLOAD_FAILED'
+            pages_status[page_status].append(futures[future])
+
+    pages_status = dict(pages_status)
     print(pages_status)
     
     # Save timestamp
@@ -600,6 +947,7 @@ def export_pdf_space():
     output_path = data.get('output_path')
     gcs_bucket_name = data.get('gcs_bucket_name')
     wait_time = data.get('wait_time')
+    concurrency = int(data.get('concurrency') or 8)
 
     if not all([domain, email, api_token, space_key]):
         return jsonify({"error": "Missing required parameters"}), 400
@@ -611,7 +959,8 @@ def export_pdf_space():
         space_key=space_key,
         output_path=output_path,
         gcs_bucket_name=gcs_bucket_name,
-        wait_time=wait_time
+        wait_time=wait_time,
+        concurrency=concurrency
     )
     return jsonify({"results": pages_status})
 
@@ -632,11 +981,19 @@ def export_pdf_page():
     page_title = data.get('page_title')
     output_path = data.get('output_path')
     gcs_bucket_name = data.get('gcs_bucket_name')
-    wait_time = int(data.get('wait_time'))
+    wait_time = int(data.get('wait_time') or 15)
 
     if not all([domain, email, api_token, page_id]):
         return jsonify({"error": "Missing required parameters"}), 400
 
+    #Redirect mode: point the client straight at the presigned URL so the PDF
+    #bytes never flow through this server
+    if data.get('redirect'):
+        url = get_pdf_export_confluence_url(domain, email, api_token, page_id)
+        if not url or not wait_for_presigned_url_ready(url):
+            return jsonify({"error": "Could not generate a download URL for the page"}), 502
+        return redirect(url, code=303)
+
     pages_status = export_pdf_confluence_page_by_id(
         domain=domain,
         email=email,
@@ -649,8 +1006,68 @@ def export_pdf_page():
     )
     return jsonify({"results": pages_status})
 
+@app.route('/export_pdf_pages_batch', methods=['POST'])
+def export_pdf_pages_batch():
+    """
+    Downloads a batch of pages from the Confluence API in a single request.
+
+    Expects the usual connection fields plus 'pages': a list of specs, each
+    with 'page_id' and optionally 'page_title'. One POST replaces N calls to
+    /export_pdf_page, and the exports share the worker pool and session.
+    """
+    print("Received request to export a batch of Confluence pages as PDFs.")
+
+    data = request.get_json()
+    print(f"Data received: {data}")
+
+    domain = data.get('domain')
+    email = data.get('email')
+    api_token = data.get('api_token')
+    pages = data.get('pages')
+    output_path = data.get('output_path')
+    gcs_bucket_name = data.get('gcs_bucket_name')
+    wait_time = int(data.get('wait_time') or 15)
+    concurrency = int(data.get('concurrency') or 8)
+
+    if not all([domain, email, api_token]) or not isinstance(pages, list) or not pages:
+        return jsonify({"error": "Missing required parameters"}), 400
+    if len(pages) > MAX_BATCH_PAGES:
+        return jsonify({"error": f"Too many pages, maximum is {MAX_BATCH_PAGES}"}), 400
+    if any(not isinstance(page, dict) or not page.get('page_id') for page in pages):
+        return jsonify({"error": "Every entry in 'pages' needs a page_id"}), 400
+
+    concurrency = max(1, min(concurrency, MAX_CONCURRENCY))
+    pages_status = defaultdict(list)
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {
+            executor.submit(
+                export_pdf_confluence_page_by_id,
+                domain=domain,
+                email=email,
+                api_token=api_token,
+                page_id=page['page_id'],
+                page_title=page.get('page_title'),
+                output_path=output_path,
+                gcs_bucket_name=gcs_bucket_name,
+                wait_time=wait_time
+            ): page['page_id']
+            for page in pages
+        }
+        for future in as_completed(futures):
+            try:
+                page_status = future.result()
+            except Exception as e:
+                print(f"Export of page {futures[future]} raised: {e}")
+                page_status = 'DOWNLOAD_FAILED'
+            pages_status[page_status].append(futures[future])
+
+    return jsonify({"results": dict(pages_status)})
+
 if __name__ == "__main__":
+    #Local development entrypoint; production runs under gunicorn (see Dockerfile)
     port = int(os.environ.get('PORT', 1111))
-    app.run(debug=True, host="0.0.0.0", port=port)
+    debug = os.environ.get('FLASK_DEBUG', '0') == '1'
+    #threaded=True so a long-running space export does not block other requests
+    app.run(debug=debug, host="0.0.0.0", port=port, threaded=True)
     
 # curl -v -X POST http://0.0.0.0:1111/export_pdf_space -H "Content-Type: application/json" -d '{"domain":"", "email":"", "api_token":"", "space_key":"", "output_path":"pdf_downloads/"}'
\ No newline at end of file